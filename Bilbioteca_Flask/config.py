@@ -29,6 +29,16 @@ class Config:
     
     # Data Encryption Key (Fernet)
     ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')
+    # Claves anteriores (separadas por comas) que aún pueden descifrar datos durante la rotación
+    ENCRYPTION_OLD_KEYS = os.environ.get('ENCRYPTION_OLD_KEYS', '')
+    # A partir de cuántas filas el cifrado/descifrado masivo usa el pool de hilos (0 = deshabilitado)
+    ENCRYPTION_PARALLEL_THRESHOLD = int(os.environ.get('ENCRYPTION_PARALLEL_THRESHOLD', 0))
+    # Filas por tarea enviada al pool de hilos
+    ENCRYPTION_BATCH_SIZE = int(os.environ.get('ENCRYPTION_BATCH_SIZE', 250))
+    # Hilos del pool (0 = usar el número de CPUs)
+    ENCRYPTION_MAX_WORKERS = int(os.environ.get('ENCRYPTION_MAX_WORKERS', 0))
+    # Filas por lote en el job de re-cifrado (rotación de claves)
+    ENCRYPTION_ROTATION_CHUNK = int(os.environ.get('ENCRYPTION_ROTATION_CHUNK', 1000))
 
     # Rate Limiting Config
     # Capacidad del bucket (ráfaga máxima)
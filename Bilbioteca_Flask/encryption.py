@@ -0,0 +1,338 @@
+from flask import current_app, has_app_context
+from cryptography.fernet import Fernet, MultiFernet
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+# Instancia única del cifrador para todo el proceso: (claves, MultiFernet).
+# Se guarda como una sola tupla para leer claves y cifrador de forma atómica.
+_cipher_state = None
+_cipher_lock = threading.Lock()
+
+# Pool de hilos compartido para el cifrado masivo (se crea bajo demanda)
+_executor = None
+_executor_lock = threading.Lock()
+
+# Estado del último job de rotación: { 'running': bool, 'rows': int, 'started': float, ... }
+_rotation_status = {'running': False, 'rows': 0}
+_rotation_lock = threading.Lock()
+
+# Valores por defecto si no hay contexto de aplicación (ej. benchmark por consola)
+_DEFAULTS = {
+    'ENCRYPTION_OLD_KEYS': '',
+    'ENCRYPTION_PARALLEL_THRESHOLD': 0,
+    'ENCRYPTION_BATCH_SIZE': 250,
+    'ENCRYPTION_MAX_WORKERS': 0,
+    'ENCRYPTION_ROTATION_CHUNK': 1000,
+}
+
+
+def _setting(name):
+    """
+    Lee un parámetro de cifrado desde la configuración de la aplicación actual.
+    """
+    if has_app_context():
+        return current_app.config.get(name, _DEFAULTS.get(name))
+    return _DEFAULTS.get(name)
+
+
+def _load_keys(config):
+    """
+    Devuelve las claves en orden: la principal (ENCRYPTION_KEY) primero,
+    seguida de las claves antiguas que solo se usan para descifrar.
+    """
+    primary = config.get('ENCRYPTION_KEY')
+    if not primary:
+        raise RuntimeError('ENCRYPTION_KEY no está configurada')
+
+    old_keys = config.get('ENCRYPTION_OLD_KEYS') or ''
+    if isinstance(old_keys, str):
+        old_keys = [k.strip() for k in old_keys.split(',') if k.strip()]
+
+    return (primary,) + tuple(k for k in old_keys if k != primary)
+
+
+def build_cipher(keys):
+    """
+    Construye un MultiFernet a partir de una lista de claves (la primera cifra).
+    """
+    return MultiFernet([Fernet(k) for k in keys])
+
+
+def get_cipher():
+    """
+    Retorna el cifrador compartido del proceso.
+    Solo se reconstruye si las claves de la configuración cambian.
+    """
+    global _cipher_state
+    keys = _load_keys(current_app.config)
+    state = _cipher_state
+    if state is not None and state[0] == keys:
+        return state[1]
+
+    with _cipher_lock:
+        if _cipher_state is None or _cipher_state[0] != keys:
+            _cipher_state = (keys, build_cipher(keys))
+        return _cipher_state[1]
+
+
+def _pool_workers():
+    return _setting('ENCRYPTION_MAX_WORKERS') or os.cpu_count() or 1
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_pool_workers(), thread_name_prefix='fernet')
+    return _executor
+
+
+# ==============================
+# CIFRADO / DESCIFRADO INDIVIDUAL
+# ==============================
+
+def _encrypt_one(cipher, value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return cipher.encrypt(value).decode('ascii')
+
+
+def _decrypt_one(cipher, token):
+    if token is None:
+        return None
+    if isinstance(token, str):
+        token = token.encode('ascii')
+    return cipher.decrypt(token).decode('utf-8')
+
+
+def encrypt_value(value):
+    """
+    Cifra un valor (str o bytes). Retorna el token como str, o None si value es None.
+    """
+    return _encrypt_one(get_cipher(), value)
+
+
+def decrypt_value(token):
+    """
+    Descifra un token generado con encrypt_value. Lanza InvalidToken si no es válido.
+    """
+    return _decrypt_one(get_cipher(), token)
+
+
+# ==============================
+# API MASIVA (RESULT SETS)
+# ==============================
+
+def _run_batch(func, cipher, values, parallel=None):
+    """
+    Aplica func a todos los valores conservando el orden.
+    Con parallel=True (o si se supera ENCRYPTION_PARALLEL_THRESHOLD, que por
+    defecto es 0 = deshabilitado) reparte el trabajo en lotes sobre el pool de
+    hilos. Fernet mantiene el GIL la mayor parte del tiempo, así que el pool
+    solo compensa con varias CPUs; medir con benchmark() antes de activarlo.
+    """
+    values = list(values)
+    if parallel is None:
+        threshold = _setting('ENCRYPTION_PARALLEL_THRESHOLD')
+        parallel = bool(threshold) and len(values) >= threshold
+
+    # Con un solo hilo el pool es solo sobrecarga
+    if not parallel or len(values) < 2 or _pool_workers() < 2:
+        return [func(cipher, v) for v in values]
+
+    size = max(1, _setting('ENCRYPTION_BATCH_SIZE'))
+    chunks = [values[i:i + size] for i in range(0, len(values), size)]
+    results = []
+    for chunk in _get_executor().map(lambda c: [func(cipher, v) for v in c], chunks):
+        results.extend(chunk)
+    return results
+
+
+def encrypt_many(values, parallel=None):
+    """
+    Cifra una lista de valores en bloque. Los None se conservan.
+    """
+    return _run_batch(_encrypt_one, get_cipher(), values, parallel)
+
+
+def decrypt_many(tokens, parallel=None):
+    """
+    Descifra una lista de tokens en bloque. Los None se conservan.
+    """
+    return _run_batch(_decrypt_one, get_cipher(), tokens, parallel)
+
+
+def decrypt_rows(rows, columns, parallel=None):
+    """
+    Descifra las columnas indicadas de un result set (dicts o Row de SQLAlchemy).
+    Retorna una lista de dicts con los valores en claro, lista para serializar.
+    Se descifra columna por columna en bloque en lugar de fila por fila.
+    """
+    records = [dict(getattr(row, '_mapping', row)) for row in rows]
+    for column in columns:
+        plain = decrypt_many([r.get(column) for r in records], parallel)
+        for record, value in zip(records, plain):
+            record[column] = value
+    return records
+
+
+# ==============================
+# ROTACIÓN DE CLAVES (MultiFernet)
+# ==============================
+
+def rotate_column(session, model, column, chunk_size=None):
+    """
+    Re-cifra con la clave principal todos los valores de model.<column>.
+    Recorre la tabla por lotes ordenados por clave primaria (keyset) para no
+    cargarla completa en memoria y confirma cada lote por separado.
+    Cada UPDATE exige que la columna conserve el token leído: si una petición
+    la modificó entretanto, esa fila se omite (su valor nuevo ya usa la clave
+    principal) en lugar de sobrescribirla con el token antiguo re-cifrado.
+    Retorna el número de filas re-cifradas.
+    """
+    from sqlalchemy import select, update, bindparam
+
+    cipher = get_cipher()
+    chunk_size = chunk_size or _setting('ENCRYPTION_ROTATION_CHUNK')
+    table = model.__table__
+    pk = list(table.primary_key.columns)[0]
+    col = table.c[column]
+
+    stmt = (
+        update(table)
+        .where(pk == bindparam('_pk'), col == bindparam('_old'))
+        .values({col.name: bindparam('_token')})
+    )
+
+    total = 0
+    last_id = None
+    while True:
+        query = select(pk, col).where(col.isnot(None)).order_by(pk).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(pk > last_id)
+
+        rows = session.execute(query).all()
+        if not rows:
+            break
+
+        tokens = _run_batch(
+            lambda c, t: c.rotate(t.encode('ascii') if isinstance(t, str) else t).decode('ascii'),
+            cipher,
+            [r[1] for r in rows],
+        )
+        # Una sentencia por fila para conocer el rowcount de cada una
+        # (no todos los drivers lo informan bien en executemany)
+        rotated = 0
+        for row, token in zip(rows, tokens):
+            result = session.execute(stmt, {'_pk': row[0], '_old': row[1], '_token': token})
+            rotated += result.rowcount
+        session.commit()
+
+        total += rotated
+        last_id = rows[-1][0]
+        with _rotation_lock:
+            _rotation_status['rows'] = _rotation_status.get('rows', 0) + rotated
+
+    return total
+
+
+def start_rotation_job(app, db, targets, chunk_size=None):
+    """
+    Lanza la rotación en un hilo en segundo plano.
+    targets: lista de tuplas (Modelo, 'columna').
+    Retorna el hilo, o None si ya hay una rotación en curso.
+    """
+    with _rotation_lock:
+        if _rotation_status.get('running'):
+            return None
+        _rotation_status.clear()
+        _rotation_status.update({'running': True, 'rows': 0, 'started': time.time()})
+
+    def run():
+        with app.app_context():
+            try:
+                for model, column in targets:
+                    count = rotate_column(db.session, model, column, chunk_size)
+                    app.logger.info(
+                        f"KEY_ROTATION: Tabla={model.__tablename__} | Columna={column} | Filas={count}"
+                    )
+            except Exception as e:
+                db.session.rollback()
+                with _rotation_lock:
+                    _rotation_status['error'] = str(e)
+                app.logger.error(f"KEY_ROTATION_ERROR: {e}")
+            finally:
+                db.session.remove()
+                with _rotation_lock:
+                    _rotation_status['running'] = False
+                    _rotation_status['finished'] = time.time()
+
+    thread = threading.Thread(target=run, name='fernet-rotation', daemon=True)
+    thread.start()
+    return thread
+
+
+def rotation_status():
+    """
+    Copia del estado del último job de rotación.
+    """
+    with _rotation_lock:
+        return dict(_rotation_status)
+
+
+def init_encryption(app):
+    """
+    Construye el cifrador al arrancar para fallar pronto si la clave es inválida.
+    """
+    if not app.config.get('ENCRYPTION_KEY'):
+        app.logger.warning('ENCRYPTION_KEY no configurada: el cifrado de campos está deshabilitado')
+        return
+    with app.app_context():
+        get_cipher()
+
+
+# ==============================
+# BENCHMARK
+# ==============================
+
+def benchmark(rows=10000, payload_size=64, parallel=None):
+    """
+    Mide filas/segundo del cifrado y descifrado masivo con una clave temporal.
+    Retorna un dict con los resultados.
+    """
+    cipher = build_cipher([Fernet.generate_key()])
+    values = [os.urandom(payload_size // 2).hex() for _ in range(rows)]
+
+    start = time.perf_counter()
+    tokens = _run_batch(_encrypt_one, cipher, values, parallel)
+    encrypt_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plain = _run_batch(_decrypt_one, cipher, tokens, parallel)
+    decrypt_time = time.perf_counter() - start
+
+    assert plain == values
+    return {
+        'rows': rows,
+        'parallel': parallel,
+        'encrypt_rows_per_sec': rows / encrypt_time if encrypt_time else float('inf'),
+        'decrypt_rows_per_sec': rows / decrypt_time if decrypt_time else float('inf'),
+    }
+
+
+if __name__ == '__main__':
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for mode in (False, True):
+        result = benchmark(rows=n, parallel=mode)
+        print(
+            f"{'pool de hilos' if mode else 'secuencial':>14}: "
+            f"cifrado={result['encrypt_rows_per_sec']:.0f} filas/s | "
+            f"descifrado={result['decrypt_rows_per_sec']:.0f} filas/s"
+        )
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de la aplicación viven en la raíz de Bilbioteca_Flask
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('cryptography')
+pytest.importorskip('sqlalchemy')
+
+from cryptography.fernet import Fernet, InvalidToken
+from flask import Flask
+from sqlalchemy import Column, Integer, String, create_engine, select, update
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import StaticPool
+
+import encryption
+
+Base = declarative_base()
+
+
+class Socio(Base):
+    __tablename__ = 'socio'
+    id = Column(Integer, primary_key=True)
+    cedula = Column(String)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['ENCRYPTION_KEY'] = Fernet.generate_key().decode()
+    app.config['ENCRYPTION_MAX_WORKERS'] = 4
+    app.config['ENCRYPTION_BATCH_SIZE'] = 3
+    encryption._cipher_state = None
+    with app.app_context():
+        yield app
+    encryption._cipher_state = None
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_many_preserves_order_and_none(app, parallel):
+    values = [f'valor-{i}' if i % 4 else None for i in range(20)]
+
+    tokens = encryption.encrypt_many(values, parallel=parallel)
+
+    assert [t is None for t in tokens] == [v is None for v in values]
+    assert encryption.decrypt_many(tokens, parallel=parallel) == values
+
+
+def test_decrypt_rows_accepts_dicts_and_mappings(app):
+    token = encryption.encrypt_value('1712345678')
+    rows = [
+        {'id': 1, 'cedula': token},
+        SimpleNamespace(_mapping={'id': 2, 'cedula': None}),
+    ]
+
+    assert encryption.decrypt_rows(rows, ['cedula']) == [
+        {'id': 1, 'cedula': '1712345678'},
+        {'id': 2, 'cedula': None},
+    ]
+
+
+def test_get_cipher_is_cached_until_keys_change(app):
+    first = encryption.get_cipher()
+    assert encryption.get_cipher() is first
+
+    app.config['ENCRYPTION_OLD_KEYS'] = Fernet.generate_key().decode()
+    second = encryption.get_cipher()
+    assert second is not first
+    assert encryption.get_cipher() is second
+
+    app.config['ENCRYPTION_KEY'] = Fernet.generate_key().decode()
+    assert encryption.get_cipher() is not second
+
+
+def test_rotate_column_reencrypts_with_primary_key(app, session):
+    old_key = Fernet.generate_key().decode()
+    app.config['ENCRYPTION_KEY'] = old_key
+    session.add_all([Socio(id=i, cedula=encryption.encrypt_value(f'ced-{i}')) for i in range(1, 6)])
+    session.add(Socio(id=6, cedula=None))
+    session.commit()
+
+    app.config['ENCRYPTION_KEY'] = Fernet.generate_key().decode()
+    app.config['ENCRYPTION_OLD_KEYS'] = old_key
+    assert encryption.rotate_column(session, Socio, 'cedula', chunk_size=2) == 5
+
+    # Sin la clave antigua los valores siguen siendo legibles
+    app.config['ENCRYPTION_OLD_KEYS'] = ''
+    tokens = session.execute(select(Socio.cedula).order_by(Socio.id)).scalars().all()
+    assert encryption.decrypt_many(tokens) == [f'ced-{i}' for i in range(1, 6)] + [None]
+
+
+def test_rotate_column_keeps_concurrent_writes(app, session, monkeypatch):
+    old_key = Fernet.generate_key().decode()
+    app.config['ENCRYPTION_KEY'] = old_key
+    session.add_all([Socio(id=i, cedula=encryption.encrypt_value(f'ced-{i}')) for i in range(1, 4)])
+    session.commit()
+
+    app.config['ENCRYPTION_KEY'] = Fernet.generate_key().decode()
+    app.config['ENCRYPTION_OLD_KEYS'] = old_key
+    written = encryption.encrypt_value('nuevo')
+    run_batch = encryption._run_batch
+
+    def write_between_select_and_update(func, cipher, values, parallel=None):
+        # Simula una petición que modifica la fila 2 durante la rotación
+        session.execute(update(Socio).where(Socio.id == 2).values(cedula=written))
+        return run_batch(func, cipher, values, parallel)
+
+    monkeypatch.setattr(encryption, '_run_batch', write_between_select_and_update)
+    assert encryption.rotate_column(session, Socio, 'cedula') == 2
+
+    assert session.get(Socio, 2).cedula == written
+    app.config['ENCRYPTION_OLD_KEYS'] = ''
+    assert encryption.decrypt_value(session.get(Socio, 1).cedula) == 'ced-1'
+    with pytest.raises(InvalidToken):
+        Fernet(old_key).decrypt(session.get(Socio, 3).cedula.encode())
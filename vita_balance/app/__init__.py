@@ -10,10 +10,17 @@ from flask_login import current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from app.cache import QueryCache
+from app.profiler import SETUP_OPTION, init_profiler
+
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
 
+# Caché de resultados para las consultas agregadas (dashboard, planes).
+# Se invalida automáticamente al confirmar escrituras en los modelos.
+cache = QueryCache()
+
 # 2. Instancia global del Limiter
 #    - key_func: Identifica a los usuarios por su dirección IP.
 #    - default_limits: Límites por defecto para TODAS las rutas de la aplicación.
@@ -29,6 +36,7 @@ def create_app():
     migrate.init_app(app, db)
     login_manager.init_app(app)
     limiter.init_app(app)  # 3. Inicializar el limiter con la app
+    cache.init_app(app)
 
     login_manager.login_view = 'auth.login'
     login_manager.login_message_category = 'warning'
@@ -49,11 +57,23 @@ def create_app():
 
         @event.listens_for(db.engine, "before_cursor_execute")
         def set_app_userid(conn, cursor, statement, parameters, context, executemany):
+            # El propio SET LOCAL vuelve a disparar este evento: se marca con
+            # profiler_setup para no reentrar y para que el perfilador lo
+            # cuente aparte de las consultas de la aplicación.
+            if context is not None and context.execution_options.get(SETUP_OPTION):
+                return
             try:
                 if current_user and not current_user.is_anonymous:
-                    conn.exec_driver_sql("SET LOCAL app.user_id = %s", (current_user.id,))
+                    conn.exec_driver_sql(
+                        "SET LOCAL app.user_id = %s", (current_user.id,),
+                        execution_options={SETUP_OPTION: True},
+                    )
             except Exception:
                 pass
+
+        # Perfilador de SQL por petición: conteo, tiempo de BD y detección N+1
+        # (cabecera X-DB-Profile y vista /_profiler)
+        init_profiler(app, db.engine)
     # ------------------------------
 
     # 🔐 BLOQUE NUEVO 2: por compatibilidad, también mantenemos el before_request
@@ -67,7 +87,10 @@ def create_app():
             if current_user and not current_user.is_anonymous:
                 uid = str(current_user.id)
                 #db.session.execute("SET LOCAL app.user_id = :uid", {"uid": uid})
-                db.session.execute(text("SET LOCAL app.user_id = :uid"), {"uid": uid})
+                db.session.execute(
+                    text("SET LOCAL app.user_id = :uid").execution_options(**{SETUP_OPTION: True}),
+                    {"uid": uid},
+                )
                 app.logger.debug(f"✔ app.user_id establecido en PostgreSQL: {uid}")
             else:
                 db.session.execute("SET LOCAL app.user_id = NULL")
@@ -0,0 +1,358 @@
+"""
+Caché de resultados (read-through) para las consultas agregadas de los blueprints.
+
+- Clave por usuario y por consulta (función + argumentos).
+- TTL por entrada e invalidación explícita al confirmar escrituras en los modelos.
+- LRU acotado en memoria del proceso y, opcionalmente, un backend compartido
+  (Redis, o un sustituto local en memoria para desarrollo/pruebas).
+- Single-flight: ante fallos concurrentes de la misma clave solo un hilo consulta
+  la base de datos; el resto espera su resultado (como máximo CACHE_WAIT_TIMEOUT
+  segundos) y, si la consulta falla, recibe la misma excepción en lugar de
+  volver a consultar.
+
+La invalidación usa contadores de versión por tabla: cada escritura confirmada
+incrementa la versión de sus tablas y las claves que dependían de ellas dejan
+de coincidir, sin tener que recorrer el caché.
+"""
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import pickle
+import threading
+import time
+
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_MISS = object()
+
+# Prefijo de los contadores de versión por tabla. Solo crecen: clear() nunca los
+# borra, o las claves antiguas que otros workers tienen en su LRU volverían a
+# coincidir con la versión actual.
+_VERSION_PREFIX = 'ver:'
+
+
+class CacheWaitTimeout(TimeoutError):
+    """Se agotó la espera por el resultado de otro hilo que consulta la misma clave."""
+
+
+class _Flight:
+    """Consulta en curso para una clave: los hilos en espera leen value/error."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """LRU acotado y seguro entre hilos con expiración por entrada."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()   # {key: (expires_at, value)}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISS
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalBackend:
+    """
+    Sustituto en memoria del backend compartido (misma interfaz que RedisBackend).
+    Solo se comparte dentro del proceso; útil en desarrollo y pruebas.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISS
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISS
+            return value
+
+    def get_many(self, keys):
+        return [self.get(k) for k in keys]
+
+    def get_counters(self, keys):
+        return [0 if v is _MISS else int(v) for v in self.get_many(keys)]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+
+    def incr(self, key):
+        with self._lock:
+            _, value = self._data.get(key, (None, 0))
+            self._data[key] = (None, value + 1)
+            return value + 1
+
+    def clear(self):
+        """Borra los valores cacheados; conserva los contadores de versión."""
+        with self._lock:
+            for key in [k for k in self._data if not k.startswith(_VERSION_PREFIX)]:
+                del self._data[key]
+
+
+class RedisBackend:
+    """
+    Backend compartido entre procesos/workers sobre Redis.
+    Los valores cacheados se guardan con pickle; los contadores de versión
+    son enteros planos de INCR y se leen con get_counters().
+    """
+
+    def __init__(self, url=None, prefix='vb:', client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return _MISS if raw is None else pickle.loads(raw)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        raws = self.client.mget([self.prefix + k for k in keys])
+        return [_MISS if raw is None else pickle.loads(raw) for raw in raws]
+
+    def get_counters(self, keys):
+        if not keys:
+            return []
+        raws = self.client.mget([self.prefix + k for k in keys])
+        return [0 if raw is None else int(raw) for raw in raws]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl) if ttl else None)
+
+    def incr(self, key):
+        # Los contadores se guardan como enteros planos para poder usar INCR
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        """Borra los valores cacheados; conserva los contadores de versión."""
+        counters = self.prefix + _VERSION_PREFIX
+        for key in self.client.scan_iter(self.prefix + '*'):
+            name = key.decode() if isinstance(key, bytes) else key
+            if not name.startswith(counters):
+                self.client.delete(key)
+
+
+class QueryCache:
+    """
+    Extensión Flask. Uso en un blueprint:
+
+        @cache.cached(models=[Plan, Registro], ttl=60)
+        def resumen_planes(user_id, mes):
+            return [dict(r._mapping) for r in db.session.execute(...)]
+
+    Los valores cacheados deben ser datos planos (dicts, listas, tuplas),
+    no instancias ORM ligadas a una sesión.
+    """
+
+    def __init__(self, app=None):
+        self.local = LRUCache()
+        self.shared = None
+        self.default_ttl = 60
+        self.wait_timeout = 10
+        self.enabled = True
+        self._versions = LocalBackend()
+        self._inflight = {}              # {key: _Flight}
+        self._inflight_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'waits': 0, 'timeouts': 0}
+        self._stats_lock = threading.Lock()
+        self._listeners = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+        self.wait_timeout = app.config.get('CACHE_WAIT_TIMEOUT', 10)
+        self.local = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 1024))
+
+        redis_url = app.config.get('CACHE_REDIS_URL')
+        if redis_url:
+            self.shared = RedisBackend(redis_url)
+        elif app.config.get('CACHE_SHARED_LOCAL', False):
+            self.shared = LocalBackend()
+        # Las versiones de tabla viven en el backend compartido si existe,
+        # para que una escritura en un worker invalide el caché de los demás.
+        self._versions = self.shared or LocalBackend()
+
+        if not self._listeners:
+            event.listen(Session, 'after_flush', _collect_written_tables)
+            event.listen(Session, 'after_commit', self._on_commit)
+            event.listen(Session, 'after_rollback', _discard_written_tables)
+            self._listeners = True
+
+        app.extensions['query_cache'] = self
+
+    # ------------------------------
+    # Claves y versiones
+    # ------------------------------
+    @staticmethod
+    def _table_names(models):
+        return sorted(getattr(m, '__tablename__', None) or str(m) for m in models or ())
+
+    def _versions_for(self, tables):
+        if not tables:
+            return ''
+        values = self._versions.get_counters([_VERSION_PREFIX + t for t in tables])
+        return '.'.join(str(v) for v in values)
+
+    def make_key(self, namespace, args=(), kwargs=None, models=None, per_user=True):
+        user = 'global'
+        if per_user:
+            try:
+                user = str(current_user.id) if not current_user.is_anonymous else 'anon'
+            except Exception:
+                user = 'anon'
+        raw = repr((args, sorted((kwargs or {}).items())))
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        tables = self._table_names(models)
+        return f"{namespace}:{user}:{digest}:{self._versions_for(tables)}"
+
+    # ------------------------------
+    # Lectura con single-flight
+    # ------------------------------
+    def get_or_load(self, key, loader, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+
+        value = self._lookup(key, ttl)
+        if value is not _MISS:
+            self._count('hits')
+            return value
+
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            # Otro hilo ya está consultando esta clave: esperar su resultado
+            self._count('waits')
+            if not flight.event.wait(self.wait_timeout):
+                self._count('timeouts')
+                raise CacheWaitTimeout(f"Tiempo de espera agotado para la clave {key}")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            # Otro líder pudo publicar el valor entre la primera consulta al
+            # caché y la toma del lock: volver a mirar antes de ir a la BD.
+            value = self._lookup(key, ttl)
+            if value is not _MISS:
+                self._count('hits')
+                flight.value = value
+                return value
+
+            self._count('misses')
+            value = loader()
+            self.local.set(key, value, ttl)
+            if self.shared is not None:
+                self.shared.set(key, value, ttl)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _lookup(self, key, ttl):
+        value = self.local.get(key)
+        if value is _MISS and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not _MISS:
+                self.local.set(key, value, ttl)
+        return value
+
+    def cached(self, namespace=None, models=None, ttl=None, per_user=True):
+        """Decorador read-through para funciones que ejecutan consultas."""
+        def decorator(func):
+            ns = namespace or f"{func.__module__}.{func.__qualname__}"
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                key = self.make_key(ns, args, kwargs, models, per_user)
+                return self.get_or_load(key, lambda: func(*args, **kwargs), ttl)
+            return wrapper
+        return decorator
+
+    # ------------------------------
+    # Invalidación
+    # ------------------------------
+    def invalidate(self, *models):
+        """Invalida todas las entradas que dependen de los modelos indicados."""
+        for table in self._table_names(models):
+            self._versions.incr(_VERSION_PREFIX + table)
+
+    def clear(self):
+        """Vacía los valores cacheados. Las versiones de tabla no se reinician."""
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def _on_commit(self, session):
+        tables = session.info.pop('cache_written_tables', None)
+        if tables:
+            for table in sorted(tables):
+                self._versions.incr(_VERSION_PREFIX + table)
+
+
+def _collect_written_tables(session, flush_context):
+    tables = session.info.setdefault('cache_written_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            tables.add(table)
+
+
+def _discard_written_tables(session):
+    session.info.pop('cache_written_tables', None)
@@ -0,0 +1,221 @@
+"""
+Perfilador de SQL por petición.
+
+Cuenta las sentencias y el tiempo de base de datos de cada request a partir de
+los eventos del engine, detecta formas de sentencia repetidas (patrón N+1) y
+expone el resultado en la cabecera X-DB-Profile y en la vista /_profiler.
+
+Presupuestos de sentencias:
+- PROFILER_STATEMENT_BUDGET: máximo global por request (None = sin límite).
+- @statement_budget(n): máximo para una vista concreta.
+Si se excede, se registra un warning; con app.testing (o PROFILER_RAISE_ON_BUDGET)
+se lanza StatementBudgetExceeded para que el test falle.
+
+Las sentencias de preparación de la sesión (el SET LOCAL app.user_id de RLS)
+se marcan con la opción de ejecución SETUP_OPTION y se cuentan aparte: no
+consumen presupuesto ni cuentan como N+1.
+
+El perfilado se activa por petición con PROFILER_ENABLED (por defecto: debug o
+testing), así que basta con poner TESTING = True después de create_app().
+"""
+from collections import Counter, deque
+import re
+import time
+
+from flask import Blueprint, abort, current_app, g, has_request_context, jsonify, request
+from flask_login import current_user
+from sqlalchemy import event
+
+# Opción de ejecución que marca sentencias de preparación (no de la aplicación)
+SETUP_OPTION = 'profiler_setup'
+
+# Historial de las últimas peticiones perfiladas (lo muestra /_profiler)
+_history = deque(maxlen=100)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,?)+\)', re.IGNORECASE)
+
+
+class StatementBudgetExceeded(AssertionError):
+    """Una ruta ejecutó más sentencias SQL que su presupuesto configurado."""
+
+
+def statement_budget(max_statements):
+    """Decorador de vista: fija el presupuesto de sentencias para esa ruta."""
+    def decorator(view):
+        view._statement_budget = max_statements
+        return view
+    return decorator
+
+
+def statement_shape(statement):
+    """Normaliza una sentencia para agrupar las que solo difieren en literales."""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _profiling_enabled(app):
+    enabled = app.config.get('PROFILER_ENABLED')
+    if enabled is None:
+        return app.debug or app.testing
+    return enabled
+
+
+def _current_profile():
+    if not has_request_context():
+        return None
+    return g.get('_db_profile')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # El inicio se guarda en el contexto de esta ejecución (no en la conexión del
+    # pool), así una sentencia que falla no deja restos para peticiones posteriores.
+    if context is not None and _current_profile() is not None:
+        context._profiler_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    started = getattr(context, '_profiler_start', None)
+    if profile is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if context.execution_options.get(SETUP_OPTION):
+        profile['setup_statements'] += 1
+        profile['setup_time'] += elapsed
+        return
+    profile['statements'] += 1
+    profile['db_time'] += elapsed
+    profile['shapes'][statement_shape(statement)] += 1
+
+
+def _route_budget(app):
+    view = app.view_functions.get(request.endpoint) if request.endpoint else None
+    budget = getattr(view, '_statement_budget', None)
+    if budget is None:
+        budget = app.config.get('PROFILER_STATEMENT_BUDGET')
+    return budget
+
+
+def _summary(profile, app):
+    threshold = app.config.get('PROFILER_N1_THRESHOLD', 5)
+    repeated = [
+        {'shape': shape, 'count': count}
+        for shape, count in profile['shapes'].most_common()
+        if count >= threshold
+    ]
+    return {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'statements': profile['statements'],
+        'db_time_ms': round(profile['db_time'] * 1000, 2),
+        'setup_statements': profile['setup_statements'],
+        'setup_time_ms': round(profile['setup_time'] * 1000, 2),
+        'request_time_ms': round((time.perf_counter() - profile['started']) * 1000, 2),
+        'n_plus_one': repeated,
+        'budget': _route_budget(app),
+    }
+
+
+def init_profiler(app, engine):
+    """
+    Registra los eventos del engine y los hooks de petición.
+    Llamar dentro del app_context (db.engine lo requiere).
+    Los hooks se registran siempre; PROFILER_ENABLED se evalúa en cada petición.
+    """
+    global _history
+    _history = deque(maxlen=app.config.get('PROFILER_HISTORY', 100))
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_db_profile():
+        if not _profiling_enabled(app):
+            return
+        g._db_profile = {
+            'statements': 0,
+            'db_time': 0.0,
+            'setup_statements': 0,
+            'setup_time': 0.0,
+            'shapes': Counter(),
+            'started': time.perf_counter(),
+        }
+
+    @app.after_request
+    def finish_db_profile(response):
+        profile = g.pop('_db_profile', None)
+        if profile is None or request.blueprint == 'profiler':
+            return response
+
+        summary = _summary(profile, app)
+        _history.append(summary)
+
+        response.headers['X-DB-Profile'] = (
+            f"statements={summary['statements']}; "
+            f"db_time_ms={summary['db_time_ms']}; "
+            f"setup_statements={summary['setup_statements']}; "
+            f"n_plus_one={len(summary['n_plus_one'])}"
+        )
+
+        for item in summary['n_plus_one']:
+            app.logger.warning(
+                f"N_PLUS_ONE: Endpoint={summary['endpoint']} | Veces={item['count']} | SQL={item['shape'][:200]}"
+            )
+
+        budget = summary['budget']
+        if budget is not None and summary['statements'] > budget:
+            message = (
+                f"{summary['method']} {summary['path']} ejecutó "
+                f"{summary['statements']} sentencias SQL (presupuesto: {budget})"
+            )
+            app.logger.warning(f"STATEMENT_BUDGET: {message}")
+            if app.config.get('PROFILER_RAISE_ON_BUDGET', app.testing):
+                raise StatementBudgetExceeded(message)
+
+        return response
+
+    app.register_blueprint(bp)
+
+
+# ------------------------------
+# Vista de administración
+# ------------------------------
+bp = Blueprint('profiler', __name__, url_prefix='/_profiler')
+
+
+@bp.before_request
+def restrict_to_admins():
+    if not _profiling_enabled(current_app):
+        abort(404)
+    if current_app.debug:
+        return None
+    if not current_user.is_authenticated or not getattr(current_user, 'is_admin', False):
+        abort(404)
+    return None
+
+
+@bp.route('/')
+def index():
+    """Últimas peticiones perfiladas, las más costosas en sentencias primero."""
+    order = request.args.get('sort', 'statements')
+    if order not in ('statements', 'db_time_ms', 'request_time_ms'):
+        order = 'statements'
+    items = sorted(_history, key=lambda item: item[order], reverse=True)
+    return jsonify({
+        'requests': items,
+        'budget_exceeded': [
+            item for item in items
+            if item['budget'] is not None and item['statements'] > item['budget']
+        ],
+    })
+
+
+@bp.route('/reset', methods=['POST'])
+def reset():
+    _history.clear()
+    return jsonify({'status': 'ok'})
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Permite importar el paquete `app` igual que lo hace la aplicación
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
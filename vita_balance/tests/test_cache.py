@@ -0,0 +1,208 @@
+import importlib
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+pytest.importorskip('flask_login')
+
+from flask import Flask
+from sqlalchemy import Column, Integer, String, create_engine, func, select
+from sqlalchemy.orm import Session, declarative_base
+
+from app.cache import LRUCache, QueryCache, RedisBackend
+
+# `app.cache` como atributo es la instancia QueryCache de app/__init__.py
+cache_module = importlib.import_module('app.cache')
+
+Base = declarative_base()
+
+
+class Plan(Base):
+    __tablename__ = 'planes'
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String)
+
+
+class FakeRedis:
+    """Cliente mínimo con la semántica de bytes de redis-py (INCR guarda b'1')."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        value = int(self.data.get(key, b'0')) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def scan_iter(self, pattern):
+        prefix = pattern.rstrip('*')
+        return [k for k in list(self.data) if k.startswith(prefix)]
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def make_cache(client=None):
+    cache = QueryCache()
+    cache.shared = RedisBackend(client=client or FakeRedis())
+    cache._versions = cache.shared
+    return cache
+
+
+def test_redis_backend_write_then_read():
+    cache = make_cache()
+    calls = []
+
+    @cache.cached(models=['planes'], per_user=False)
+    def resumen(mes):
+        calls.append(mes)
+        return {'mes': mes, 'total': len(calls)}
+
+    assert resumen(3) == {'mes': 3, 'total': 1}
+    assert resumen(3) == {'mes': 3, 'total': 1}
+
+    # Escritura confirmada sobre la tabla: el contador queda como b'1' en Redis
+    cache._on_commit(SimpleNamespace(info={'cache_written_tables': {'planes'}}))
+    assert cache.shared.client.data['vb:ver:planes'] == b'1'
+
+    assert resumen(3) == {'mes': 3, 'total': 2}
+    cache.invalidate('planes')
+    assert resumen(3) == {'mes': 3, 'total': 3}
+    assert calls == [3, 3, 3]
+
+
+def test_single_flight_waiters_share_leader_error():
+    cache = QueryCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def failing_loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError('consulta fallida')
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load('k', failing_loader)
+        except RuntimeError as e:
+            errors.append(e)
+
+    first = threading.Thread(target=call)
+    first.start()
+    started.wait(5)
+    others = [threading.Thread(target=call) for _ in range(4)]
+    for t in others:
+        t.start()
+    deadline = time.monotonic() + 5
+    while cache.stats['waits'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in [first] + others:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert len(errors) == 5
+
+
+def test_clear_does_not_rewind_versions_on_other_workers():
+    client = FakeRedis()
+    worker_a, worker_b = make_cache(client), make_cache(client)
+    data = {'valor': 'old'}
+
+    @worker_b.cached(models=['planes'], per_user=False)
+    def leer():
+        return data['valor']
+
+    assert leer() == 'old'
+    worker_a.invalidate('planes')
+    data['valor'] = 'new'
+    worker_a.clear()
+
+    assert client.data['vb:ver:planes'] == b'1'
+    assert leer() == 'new'
+
+
+def test_entries_expire_after_ttl():
+    cache = QueryCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_load('k', loader, ttl=0.05) == 1
+    assert cache.get_or_load('k', loader, ttl=0.05) == 1
+    time.sleep(0.1)
+    assert cache.get_or_load('k', loader, ttl=0.05) == 2
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_entries=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+
+    assert len(lru) == 2
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+    assert lru.get('b') is cache_module._MISS
+
+
+def test_keys_are_per_user(monkeypatch):
+    cache = QueryCache()
+    calls = []
+
+    @cache.cached(models=['planes'])
+    def resumen():
+        calls.append(cache_module.current_user.id)
+        return cache_module.current_user.id
+
+    for user_id in (1, 2, 1, 2):
+        monkeypatch.setattr(cache_module, 'current_user', SimpleNamespace(id=user_id, is_anonymous=False))
+        assert resumen() == user_id
+
+    assert calls == [1, 2]
+
+
+def test_commit_invalidates_and_rollback_does_not():
+    cache = QueryCache()
+    cache.init_app(Flask(__name__))
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    calls = []
+
+    with Session(engine) as session:
+        @cache.cached(models=[Plan], per_user=False)
+        def total_planes():
+            calls.append(1)
+            return session.scalar(select(func.count()).select_from(Plan))
+
+        assert total_planes() == 0
+
+        session.add(Plan(nombre='Caminar'))
+        session.commit()
+        assert total_planes() == 1
+        assert len(calls) == 2
+
+        session.add(Plan(nombre='Correr'))
+        session.flush()
+        session.rollback()
+        assert total_planes() == 1
+        assert len(calls) == 2
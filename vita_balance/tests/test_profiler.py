@@ -0,0 +1,89 @@
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+pytest.importorskip('flask_login')
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from app.profiler import SETUP_OPTION, StatementBudgetExceeded, init_profiler, statement_budget, statement_shape
+
+
+@pytest.fixture
+def engine():
+    return create_engine('sqlite://')
+
+
+@pytest.fixture
+def client(engine):
+    app = Flask(__name__)
+    with app.app_context():
+        init_profiler(app, engine)
+
+    @app.route('/dos')
+    @statement_budget(1)
+    def dos():
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            conn.execute(text('SELECT 2'))
+        return 'ok'
+
+    @app.route('/bucle')
+    def bucle():
+        with engine.connect() as conn:
+            for i in range(6):
+                conn.execute(text('SELECT :id'), {'id': i})
+        return 'ok'
+
+    @app.route('/preparacion')
+    @statement_budget(1)
+    def preparacion():
+        with engine.connect() as conn:
+            for i in range(6):
+                conn.exec_driver_sql('SELECT ?', (i,), execution_options={SETUP_OPTION: True})
+            conn.execute(text('SELECT 1'))
+        return 'ok'
+
+    # Como un fixture normal: TESTING se activa después de crear la app
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_budget_exceeded_fails_under_testing(client):
+    with pytest.raises(StatementBudgetExceeded):
+        client.get('/dos')
+
+
+def test_header_reports_n_plus_one(client):
+    response = client.get('/bucle')
+
+    header = response.headers['X-DB-Profile']
+    assert 'statements=6;' in header
+    assert 'n_plus_one=1' in header
+
+
+def test_setup_statements_are_counted_apart(client):
+    response = client.get('/preparacion')
+
+    header = response.headers['X-DB-Profile']
+    assert 'statements=1;' in header
+    assert 'setup_statements=6;' in header
+    assert 'n_plus_one=0' in header
+
+
+def test_disabled_profiler_adds_no_header(client):
+    client.application.config['PROFILER_ENABLED'] = False
+
+    assert 'X-DB-Profile' not in client.get('/dos').headers
+
+
+@pytest.mark.parametrize('statement, shape', [
+    ("SELECT * FROM planes WHERE id IN (?, ?, ?)", "SELECT * FROM planes WHERE id IN (...)"),
+    ("SELECT * FROM planes WHERE id in (%(id_1)s, %(id_2)s)", "SELECT * FROM planes WHERE id IN (...)"),
+    ("SELECT * FROM planes WHERE nombre = 'Caminar'", "SELECT * FROM planes WHERE nombre = ?"),
+    ("SELECT * FROM planes WHERE nombre = 'O''Brien'", "SELECT * FROM planes WHERE nombre = ?"),
+    ("SELECT * FROM planes\n  WHERE id = 42 LIMIT 10", "SELECT * FROM planes WHERE id = ? LIMIT ?"),
+    ("SELECT * FROM planes WHERE id = %(id_1)s", "SELECT * FROM planes WHERE id = %(id_1)s"),
+])
+def test_statement_shape(statement, shape):
+    assert statement_shape(statement) == shape